@@ -2,13 +2,159 @@
 Initialize and load the AI model
 """
 
-import json
+import os
 import re
-import time
-from llama_cpp import Llama
-from config import MODEL_PATH, MODEL_CONFIG, SYSTEM_PROMPT, IS_RASPBERRY_PI
+import threading
+from collections import OrderedDict
+try:
+    import orjson as json  # Faster parsing, optional
+except ImportError:
+    import json
+from config import (
+    MODEL_PATH, MODEL_CONFIG, SYSTEM_PROMPT, RESPONSE_GRAMMAR,
+    GENERATION_CONFIG, RESPONSE_CACHE_SIZE, IS_RASPBERRY_PI
+)
 from action import validate_action, execute_action, get_status_action
 
+# Prompt text shared by every request. llama-cpp keeps the KV cache of the
+# last evaluated tokens and reuses the longest matching prefix, so once this
+# has been evaluated it is not prefilled again on later turns.
+_PROMPT_PREFIX = f"{SYSTEM_PROMPT}\n\nUser:"
+
+# Context that should be left for the user's input after the prompt prefix
+# and the longest reply
+_MIN_USER_TOKENS = 50
+
+# Characters that change the JSON scanner's state outside and inside strings
+_STRUCTURE_RE = re.compile(r'[{}"]')
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+
+# Keyword sets used when parsing model output
+_TIME_KEYWORDS = ("time", "clock", "hour")
+_LED_KEYWORDS = ("led", "light", "turn on", "turn off", "toggle", "switch")
+_BLINK_KEYWORDS = ("blink", "flash", "flicker")
+_STOP_KEYWORDS = ("stop", "end", "cease")
+_STATUS_KEYWORDS = ("status", "state")
+
+
+class _JsonSpanScanner:
+    """
+    Incremental scanner for the first balanced {...} object in a text
+    
+    The text may be fed again as it grows (e.g. while streaming tokens);
+    scanning resumes where the previous call stopped. Instead of stepping
+    through every character in Python, the scanner jumps between the
+    characters that can change its state using compiled regex searches.
+    """
+    
+    def __init__(self):
+        self.start = None  # Offset of the opening brace
+        self.end = None  # Offset just past the closing brace
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+    
+    def feed(self, text):
+        """
+        Continue scanning text
+        
+        Args:
+            text (str): All text seen so far
+            
+        Returns:
+            bool: True once the object is complete
+        """
+        if self.end is not None:
+            return True
+        
+        pos = self._pos
+        if self.start is None:
+            pos = text.find('{', pos)
+            if pos < 0:
+                self._pos = len(text)
+                return False
+            self.start = pos
+        
+        depth = self._depth
+        in_string = self._in_string
+        while True:
+            pattern = _STRING_SPECIAL_RE if in_string else _STRUCTURE_RE
+            match = pattern.search(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            ch = match.group()
+            if in_string:
+                if ch == '\\':
+                    pos += 1  # Skip the escaped character
+                else:
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    self.end = pos
+                    return True
+        
+        # pos is past the end only when the text ends in an escape
+        self._pos = max(pos, len(text))
+        self._depth = depth
+        self._in_string = in_string
+        return False
+
+
+def _find_json_span(text):
+    """
+    Find the first balanced {...} object in text in a single forward pass
+    
+    Args:
+        text (str): Text potentially containing JSON
+        
+    Returns:
+        tuple or None: (start, end) slice bounds of the object, or None
+    """
+    scanner = _JsonSpanScanner()
+    if scanner.feed(text):
+        return scanner.start, scanner.end
+    return None
+
+
+def _prefetch_model_file(path):
+    """
+    Start reading the model file into the page cache in the background
+    
+    llama-cpp mmaps the weights and would otherwise fault them in from the
+    SD card page by page during warm-up; prefetching overlaps those reads
+    with model setup.
+    
+    Args:
+        path (str): Path to the GGUF model file
+    """
+    if hasattr(os, "posix_fadvise"):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return  # Missing files are reported by the model loader
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+        return
+    
+    # No fadvise on this platform: warm the cache by reading the file
+    def _read_file():
+        try:
+            with open(path, "rb") as f:
+                while f.read(1 << 20):
+                    pass
+        except OSError:
+            pass
+    
+    threading.Thread(target=_read_file, daemon=True).start()
+
 
 class AISystem:
     """
@@ -17,36 +163,50 @@ class AISystem:
     
     def __init__(self):
         """Initialize the AI model"""
-        print("="*60)
-        print("🤖 AI Assistant for Raspberry Pi Zero 2W")
-        print("="*60)
-        
-        if IS_RASPBERRY_PI:
-            print("✅ Running on Raspberry Pi")
-        else:
-            print("⚠️  Running in simulation mode (not on Raspberry Pi)")
+        mode = ("✅ Running on Raspberry Pi" if IS_RASPBERRY_PI
+                else "⚠️  Running in simulation mode (not on Raspberry Pi)")
+        print("="*60 + "\n🤖 AI Assistant for Raspberry Pi Zero 2W\n" + "="*60 + "\n" + mode)
         
         self.model = None
         self.last_response = None
+        self._prefix_tokens = None
+        self.grammar = None
+        self._response_cache = OrderedDict()  # Normalized input -> response
         self._load_model()
-        print("✅ AI System initialized successfully!")
-        print("="*60)
+        print("✅ AI System initialized successfully!\n" + "="*60)
     
     def _load_model(self):
         """Load the GGUF model using llama-cpp-python"""
+        # Imported here so that loading this module stays cheap; an
+        # ImportError is left to propagate to the caller
+        from llama_cpp import Llama
+        
         try:
             print(f"📦 Loading model from: {MODEL_PATH}")
             
             # Adjust config for RPi memory constraints
             if IS_RASPBERRY_PI:
                 print("⚙️  Optimizing for Raspberry Pi Zero 2W memory...")
-                time.sleep(1)  # Give time to read message
             
+            _prefetch_model_file(MODEL_PATH)
             self.model = Llama(
                 model_path=MODEL_PATH,
                 **MODEL_CONFIG
             )
             
+            # The shared prompt prefix never changes, so tokenize it once
+            self._prefix_tokens = self.model.tokenize(_PROMPT_PREFIX.encode("utf-8"))
+            
+            # The prefix, the user's input and the longest reply share n_ctx
+            spare = (MODEL_CONFIG["n_ctx"] - len(self._prefix_tokens)
+                     - GENERATION_CONFIG["max_tokens"])
+            if spare < _MIN_USER_TOKENS:
+                print(f"⚠️  Warning: n_ctx={MODEL_CONFIG['n_ctx']} leaves only "
+                      f"{spare} tokens for user input")
+            
+            # Constrain generation to the response format
+            self.grammar = self._load_grammar()
+            
             # Warm up the model with a simple request
             self._warm_up()
             
@@ -55,14 +215,29 @@ class AISystem:
         except Exception as e:
             raise Exception(f"Failed to load model: {str(e)}")
     
+    def _load_grammar(self):
+        """
+        Compile the response grammar
+        
+        Returns:
+            LlamaGrammar or None: The grammar, or None if it cannot be loaded,
+            in which case output is parsed with the keyword fallback
+        """
+        try:
+            from llama_cpp import LlamaGrammar
+            return LlamaGrammar.from_string(RESPONSE_GRAMMAR, verbose=False)
+        except Exception as e:
+            print(f"⚠️  Warning: Response grammar unavailable - {str(e)}")
+            return None
+    
     def _warm_up(self):
-        """Send a warm-up request to initialize the model"""
+        """Warm up the model by evaluating the shared system prompt prefix"""
         try:
-            warm_up_prompt = f"{SYSTEM_PROMPT}\n\nUser: Hello\nAssistant:"
+            # One token is enough to run every layer; the prefix stays in
+            # the KV cache for the first real request
             _ = self.model(
-                warm_up_prompt,
-                max_tokens=50,
-                stop=["User:", "\n\n"],
+                self._prefix_tokens,
+                max_tokens=1,
                 temperature=0.1
             )
             print("✅ Model warm-up complete")
@@ -79,41 +254,65 @@ class AISystem:
         Returns:
             dict: Contains response text and action (if any)
         """
-        # Prepare the prompt
-        prompt = f"{SYSTEM_PROMPT}\n\nUser: {user_input}\nAssistant:"
+        # Answer repeated inputs from the cache, most recently used last
+        cache_key = " ".join(user_input.lower().split())
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            self.last_response = cached["raw_response"]
+            # A copy, so callers changing their response cannot alter the cache
+            return dict(cached)
+        
+        # Prepare the prompt; only the user's part needs tokenizing
+        prompt = self._prefix_tokens + self.model.tokenize(
+            f" {user_input}\nAssistant:".encode("utf-8"),
+            add_bos=False
+        )
         
-        # Generate response with parameters optimized for RPi
-        response = self.model(
+        # Stream the response and stop decoding as soon as the JSON object
+        # is complete instead of running on to max_tokens
+        stream = self.model(
             prompt,
-            max_tokens=150,  # Reduced for RPi
-            stop=["User:", "###"],
             echo=False,
-            temperature=0.2,  # Lower temperature for more reliable JSON
-            top_p=0.9,
-            repeat_penalty=1.1
+            stream=True,
+            grammar=self.grammar,
+            **GENERATION_CONFIG
         )
+        scanner = _JsonSpanScanner()
+        ai_response = ""
+        for chunk in stream:
+            ai_response += chunk['choices'][0]['text']
+            if scanner.feed(ai_response):
+                break
+        stream.close()
         
-        # Extract the generated text
-        ai_response = response['choices'][0]['text'].strip()
+        # Keep the object found while streaming so it is not searched for again
+        json_text = ai_response[scanner.start:scanner.end] if scanner.end else None
+        ai_response = ai_response.strip()
         self.last_response = ai_response
         
         # Parse the response
-        parsed_response = self._parse_response(ai_response)
+        parsed_response = self._parse_response(ai_response, json_text)
+        
+        self._response_cache[cache_key] = dict(parsed_response)
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
         
         return parsed_response
     
-    def _parse_response(self, ai_response):
+    def _parse_response(self, ai_response, json_text=None):
         """
         Parse AI response to extract JSON structure
         
         Args:
             ai_response (str): Raw AI response text
+            json_text (str, optional): JSON object already located in the response
             
         Returns:
             dict: Parsed response with text and action
         """
         # Try to parse as JSON
-        json_data = self._extract_json(ai_response)
+        json_data = self._extract_json(ai_response, json_text)
         
         if json_data:
             # Validate JSON structure
@@ -127,36 +326,29 @@ class AISystem:
         # Fallback: Try to extract action using keywords
         return self._fallback_parse(ai_response)
     
-    def _extract_json(self, text):
+    def _extract_json(self, text, json_text=None):
         """
         Extract and parse JSON from text
         
         Args:
             text (str): Text potentially containing JSON
+            json_text (str, optional): JSON object already located in text
             
         Returns:
             dict or None: Parsed JSON or None
         """
+        if json_text is None:
+            # Find the first complete JSON object in the response; any code
+            # block markers around it are skipped by the scan
+            span = _find_json_span(text)
+            if not span:
+                return None
+            json_text = text[span[0]:span[1]]
+        
         try:
-            # Find JSON in the response
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                return json.loads(json_str)
-        except json.JSONDecodeError:
-            # Try to fix common JSON issues
-            try:
-                # Remove any code block markers
-                cleaned = text.strip()
-                if cleaned.startswith('```json'):
-                    cleaned = cleaned[7:]
-                if cleaned.endswith('```'):
-                    cleaned = cleaned[:-3]
-                cleaned = cleaned.strip()
-                return json.loads(cleaned)
-            except:
-                pass
-        return None
+            return json.loads(json_text)
+        except ValueError:  # Base of both json and orjson decode errors
+            return None
     
     def _fallback_parse(self, text):
         """
@@ -170,49 +362,41 @@ class AISystem:
         """
         text_lower = text.lower()
         
-        # Check for time-related keywords
-        time_keywords = ["time", "clock", "what time", "current time", "hour"]
-        has_time_keyword = any(keyword in text_lower for keyword in time_keywords)
-        
-        # Check for LED toggle keywords
-        led_keywords = ["led", "light", "turn on", "turn off", "toggle", "switch"]
-        has_led_keyword = any(keyword in text_lower for keyword in led_keywords)
-        
-        # Check for blink keywords
-        blink_keywords = ["blink", "flash", "flicker"]
-        has_blink_keyword = any(keyword in text_lower for keyword in blink_keywords)
+        # Keyword groups are checked in the order the action is decided, so
+        # a group is only scanned when its result can still matter
         
-        # Check for stop keywords
-        stop_keywords = ["stop", "end", "cease"]
-        has_stop_keyword = any(keyword in text_lower for keyword in stop_keywords)
-        
-        # Determine action based on keywords
-        if has_time_keyword:
+        # Check for time-related keywords
+        if any(keyword in text_lower for keyword in _TIME_KEYWORDS):
             return {
                 "text": "I'll check the current time for you.",
                 "action": "print_time",
                 "raw_response": text
             }
-        elif has_led_keyword and not has_blink_keyword:
+        
+        # Check for blink keywords, then LED toggle keywords
+        has_blink_keyword = any(keyword in text_lower for keyword in _BLINK_KEYWORDS)
+        if not has_blink_keyword and any(keyword in text_lower for keyword in _LED_KEYWORDS):
             return {
                 "text": "I'll toggle the LED for you.",
                 "action": "toggle_led",
                 "raw_response": text
             }
-        elif has_blink_keyword:
-            if has_stop_keyword:
+        
+        if has_blink_keyword:
+            # Check for stop keywords
+            if any(keyword in text_lower for keyword in _STOP_KEYWORDS):
                 return {
                     "text": "Stopping the blinking LED.",
                     "action": "stop_blink",
                     "raw_response": text
                 }
-            else:
-                return {
-                    "text": "I'll make the LED blink.",
-                    "action": "blink_led",
-                    "raw_response": text
-                }
-        elif "status" in text_lower or "state" in text_lower:
+            return {
+                "text": "I'll make the LED blink.",
+                "action": "blink_led",
+                "raw_response": text
+            }
+        
+        if any(keyword in text_lower for keyword in _STATUS_KEYWORDS):
             return {
                 "text": "Here's the current system status.",
                 "action": "get_status",
@@ -2,6 +2,7 @@
 Configuration for the AI system
 """
 
+import os
 import sys
 import platform
 
@@ -17,20 +18,53 @@ IS_RASPBERRY_PI = SYSTEM_INFO["machine"].startswith("arm") or "raspberry" in SYS
 
 # Model configuration
 MODEL_PATH = "./SmolLM2-360M-Instruct-Q2_K.gguf"
+
+# Only lock the model in RAM when there is room for it twice over; otherwise
+# let the kernel page weights in from the mmap and keep memory for the KV cache
+try:
+    _physical_ram = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    LOCK_MODEL_IN_RAM = _physical_ram > 2 * os.path.getsize(MODEL_PATH)
+except (AttributeError, ValueError, OSError):
+    LOCK_MODEL_IN_RAM = False
+
+# CPU cores this process may run on (respects taskset/cgroup limits)
+try:
+    CPU_COUNT = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPU_COUNT = os.cpu_count() or 4
+
 MODEL_CONFIG = {
-    "n_ctx": 1024,  # Reduced for RPi Zero 2W memory constraints
-    "n_threads": 4,  # Use all cores on RPi Zero 2W
+    # System prompt (~300 tokens) + user input + reply (max_tokens); sized
+    # for RPi Zero 2W memory while leaving room for the load-time budget check
+    "n_ctx": 768,
+    "n_threads": max(1, CPU_COUNT - 1),  # Leave a core for input and I/O
     "n_gpu_layers": 0,  # CPU only for RPi
     "verbose": False,
-    "use_mlock": True  # Lock memory to prevent swapping
+    "use_mmap": True,  # Page weights in on demand
+    "use_mlock": LOCK_MODEL_IN_RAM  # Lock memory to prevent swapping
 }
 
+# Sampling for the JSON replies. Decoding is greedy, so top-p and the repeat
+# penalty would only add per-token passes over the vocabulary
+GENERATION_CONFIG = {
+    "max_tokens": 150,  # Reduced for RPi
+    "stop": ["User:", "###"],
+    "temperature": 0.0,
+    "top_k": 1,
+    "top_p": 1.0,
+    "repeat_penalty": 1.0
+}
+
+# Number of recent inputs whose parsed responses are kept, so repeated
+# commands like "what time is it" skip the model entirely
+RESPONSE_CACHE_SIZE = 128
+
 # Raspberry Pi specific configuration
 if IS_RASPBERRY_PI:
     # Optimize for Raspberry Pi Zero 2W
     MODEL_CONFIG.update({
-        "n_batch": 128,  # Smaller batch size for RPi memory
-        "n_threads_batch": 2,  # Threads for batch processing
+        "n_batch": 64,  # Small batches keep the working set in the A53's L2
+        "n_threads_batch": max(1, CPU_COUNT // 2),  # Threads for batch processing
     })
     
     # GPIO Configuration
@@ -38,7 +72,18 @@ if IS_RASPBERRY_PI:
         "pin_mode": "BCM",  # BCM pin numbering (GPIO numbers, not physical pins)
         "default_led_pin": 17,  # GPIO17 (physical pin 11)
         "default_button_pin": 27,  # GPIO27 (physical pin 13)
+        "gpio_chip": "/dev/gpiochip0",  # Chip holding the header pins (gpiod only)
         "pwm_frequency": 100,  # Hz
+        # "thread" (Python thread), "pwm" (RPi.GPIO PWM; needs RPi.GPIO as
+        # the driver, not gpiod) or "itimer" (SIGALRM ticks, main thread only)
+        "blink_backend": "thread",
+        "isolated_cpu": None,  # CPU for the blink thread, e.g. one listed in isolcpus=
+        "log_blink_edges": False,  # Log every blink edge at debug level (slow at short intervals)
+        # Name of a kernel LED under /sys/class/leds wired to the LED pin
+        # (e.g. from "dtoverlay=gpio-led,gpio=17,label=ai-led"). When set,
+        # the kernel owns the pin: on/off goes through the LED's brightness
+        # file and blinking through its timer trigger instead of a thread.
+        "led_sysfs_name": None,
     }
 else:
     GPIO_CONFIG = {
@@ -73,4 +118,15 @@ RESPONSE FORMAT RULES:
 
 5. IMPORTANT: Never invent or guess the time. Always use "print_time" action.
 6. Keep responses brief and natural.
-7. Use ONLY valid JSON format. No other text."""
\ No newline at end of file
+7. Use ONLY valid JSON format. No other text."""
+
+# GBNF grammar matching the response format above. Generation is constrained
+# to it so the model can only emit valid JSON with a known action. Strings
+# exclude raw control characters, which JSON parsers reject, and whitespace
+# is limited to one character so greedy decoding cannot pad up to max_tokens.
+RESPONSE_GRAMMAR = r'''
+root   ::= "{" ws "\"text\":" ws string "," ws "\"action\":" ws action ws "}"
+action ::= "\"print_time\"" | "\"toggle_led\"" | "\"blink_led\"" | "\"stop_blink\"" | "\"get_status\"" | "null"
+string ::= "\"" ( [^"\\\x00-\x1f] | "\\" (["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F]) )* "\""
+ws     ::= | " " | "\n"
+'''
\ No newline at end of file
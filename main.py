@@ -6,13 +6,18 @@ import sys
 import os
 import signal
 import atexit
+import logging
+
+# Modules such as rasp log through logging; show their info messages plainly.
+# Configured before the project imports so messages logged at import time
+# are not dropped.
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from init import AISystem
 from action import cleanup_actions
-from config import IS_RASPBERRY_PI, GPIO_CONFIG
+from config import IS_RASPBERRY_PI, GPIO_CONFIG, MODEL_PATH
 
 
 def signal_handler(signum, frame):
@@ -25,40 +30,45 @@ def signal_handler(signum, frame):
 
 def display_welcome():
     """Display welcome message and instructions"""
-    print("\n" + "="*60)
-    print("🤖 RASPBERRY PI ZERO 2W AI ASSISTANT".center(60))
-    print("="*60)
-    
-    print(f"\n📋 System: {'Raspberry Pi Zero 2W ✅' if IS_RASPBERRY_PI else 'Simulation Mode 🔄'}")
-    
-    print("\n💡 AVAILABLE COMMANDS:")
-    print("  • Time related:")
-    print("    - 'What time is it?'")
-    print("    - 'Tell me the current time'")
-    print("    - 'Time please'")
-    
-    print("\n  • LED Control (GPIO):")
-    print("    - 'Turn on the LED'")
-    print("    - 'Turn off the light'")
-    print("    - 'Toggle the LED'")
-    print("    - 'Blink the LED'")
-    print("    - 'Blink for 10 seconds'")
-    print("    - 'Stop blinking'")
-    
-    print("\n  • System:")
-    print("    - 'Show status'")
-    print("    - 'Get system info'")
-    print("    - 'quit', 'exit', or 'bye' - End program")
+    # Collected first and written with a single print; each print is a
+    # separate write, which is slow on the Pi's serial console
+    lines = [
+        "\n" + "="*60,
+        "🤖 RASPBERRY PI ZERO 2W AI ASSISTANT".center(60),
+        "="*60,
+        f"\n📋 System: {'Raspberry Pi Zero 2W ✅' if IS_RASPBERRY_PI else 'Simulation Mode 🔄'}",
+        
+        "\n💡 AVAILABLE COMMANDS:",
+        "  • Time related:",
+        "    - 'What time is it?'",
+        "    - 'Tell me the current time'",
+        "    - 'Time please'",
+        
+        "\n  • LED Control (GPIO):",
+        "    - 'Turn on the LED'",
+        "    - 'Turn off the light'",
+        "    - 'Toggle the LED'",
+        "    - 'Blink the LED'",
+        "    - 'Blink for 10 seconds'",
+        "    - 'Stop blinking'",
+        
+        "\n  • System:",
+        "    - 'Show status'",
+        "    - 'Get system info'",
+        "    - 'quit', 'exit', or 'bye' - End program",
+    ]
     
     if IS_RASPBERRY_PI:
-        print(f"\n🔌 GPIO Configuration:")
-        print(f"   LED Pin: GPIO{GPIO_CONFIG.get('default_led_pin', 'N/A')}")
+        lines.append("\n🔌 GPIO Configuration:")
+        lines.append(f"   LED Pin: GPIO{GPIO_CONFIG.get('default_led_pin', 'N/A')}")
         if GPIO_CONFIG.get('default_button_pin'):
-            print(f"   Button Pin: GPIO{GPIO_CONFIG['default_button_pin']}")
+            lines.append(f"   Button Pin: GPIO{GPIO_CONFIG['default_button_pin']}")
+    
+    lines.append("\n⚠️  Note: LED commands will control")
+    lines.append(f"   GPIO pin {GPIO_CONFIG.get('default_led_pin', 'simulated')}")
+    lines.append("="*60 + "\n")
     
-    print("\n⚠️  Note: LED commands will control")
-    print(f"   GPIO pin {GPIO_CONFIG.get('default_led_pin', 'simulated')}")
-    print("="*60 + "\n")
+    print("\n".join(lines))
 
 
 def main():
@@ -74,13 +84,12 @@ def main():
         # Display welcome message
         display_welcome()
         
-        # Initialize AI system
+        # Initialize AI system (llama-cpp is only imported from here on)
         print("🚀 Initializing AI Assistant...")
+        from init import AISystem
         ai_system = AISystem()
         
-        print("\n" + "="*60)
-        print("✅ Assistant is ready! Type your command below.")
-        print("="*60 + "\n")
+        print("\n" + "="*60 + "\n✅ Assistant is ready! Type your command below.\n" + "="*60 + "\n")
         
         # Main chat loop
         while True:
@@ -119,7 +128,7 @@ def main():
     except FileNotFoundError as e:
         print(f"\n❌ File Error: {str(e)}")
         print("   Please check that the model file exists in the correct location.")
-        print(f"   Expected path: {os.path.abspath('./SmolLM2-360M-Instruct-Q2_K.gguf')}")
+        print(f"   Expected path: {os.path.abspath(MODEL_PATH)}")
     except ImportError as e:
         print(f"\n❌ Import Error: {str(e)}")
         print("   Please install required packages:")
@@ -134,9 +143,7 @@ def main():
     finally:
         # Cleanup
         cleanup_actions()
-        print("\n" + "="*60)
-        print("🤖 AI Assistant terminated.")
-        print("="*60)
+        print("\n" + "="*60 + "\n🤖 AI Assistant terminated.\n" + "="*60)
 
 
 if __name__ == "__main__":
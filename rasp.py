@@ -3,72 +3,564 @@ Raspberry Pi GPIO module for Raspberry Pi Zero 2W
 Handles GPIO initialization, control, and cleanup
 """
 
+import os
+import mmap
+import logging
 import time
+import queue
+import select
+import signal
 import threading
+from datetime import timedelta
+from importlib.util import find_spec
 from config import IS_RASPBERRY_PI, GPIO_CONFIG
 
-print(f"[RaspPi] Running on Raspberry Pi: {IS_RASPBERRY_PI}")
-print(f"[RaspPi] GPIO Config: {GPIO_CONFIG}")
+# Messages on the toggle and blink paths are debug level, so their
+# formatting is skipped unless debug logging is enabled
+logger = logging.getLogger("rasp")
 
-# Try to import GPIO libraries
+logger.info("[RaspPi] Running on Raspberry Pi: %s", IS_RASPBERRY_PI)
+logger.info("[RaspPi] GPIO Config: %s", GPIO_CONFIG)
+
+# GPIO drivers in order of preference: gpiod (libgpiod v2), RPi.GPIO, then
+# the kernel's legacy sysfs interface. gpiod and sysfs number lines by BCM
+# GPIO, so BOARD numbering always goes through RPi.GPIO.
+_DRIVER_ORDER = ("gpiod", "RPi.GPIO", "sysfs")
+
+# Driver modules, imported by _load_gpio_driver on first initialize_gpio so
+# importing this module does not pay for the library's setup
+GPIO = None
+gpiod = None
+Bias = Direction = Edge = Value = None
+
+def _driver_present(driver):
+    """Check whether a GPIO driver is installed, without importing it"""
+    if driver == "gpiod":
+        return GPIO_CONFIG["pin_mode"] == "BCM" and find_spec("gpiod") is not None
+    if driver == "RPi.GPIO":
+        return find_spec("RPi") is not None and find_spec("RPi.GPIO") is not None
+    return (GPIO_CONFIG["pin_mode"] == "BCM"
+            and os.access("/sys/class/gpio/export", os.W_OK))
+
+GPIO_DRIVER = None
 if IS_RASPBERRY_PI:
-    try:
-        import RPi.GPIO as GPIO
-        GPIO_AVAILABLE = True
-        print("[RaspPi] RPi.GPIO library loaded successfully")
-    except ImportError as e:
-        print(f"[RaspPi] Warning: RPi.GPIO not available: {e}")
-        print("[RaspPi] Running in simulation mode")
-        GPIO_AVAILABLE = False
+    GPIO_DRIVER = next((d for d in _DRIVER_ORDER if _driver_present(d)), None)
+    GPIO_AVAILABLE = GPIO_DRIVER is not None
+    if GPIO_AVAILABLE:
+        logger.info("[RaspPi] Using %s for GPIO", GPIO_DRIVER)
+    else:
+        logger.warning("[RaspPi] Warning: no GPIO library or sysfs GPIO found")
+        logger.info("[RaspPi] Running in simulation mode")
         IS_RASPBERRY_PI = False
 else:
     GPIO_AVAILABLE = False
-    print("[RaspPi] Not on Raspberry Pi, running in simulation mode")
+    logger.info("[RaspPi] Not on Raspberry Pi, running in simulation mode")
+
+# Real hardware or simulation; fixed for the life of the process, so the
+# toggle and blink implementations are picked once below
+_REAL = IS_RASPBERRY_PI and GPIO_AVAILABLE
 
-# GPIO state tracking
-gpio_state = {
-    "led_on": False,
-    "blinking": False,
-    "initialized": False
-}
+class GpioState:
+    """GPIO state tracking, shared by callers and the blink thread"""
+    __slots__ = ("led_on", "blinking", "initialized")
+    
+    def __init__(self):
+        self.led_on = False
+        self.blinking = False
+        self.initialized = False
+
+# Held while a read-modify-write or multi-field read of gpio_state is made
+gpio_state = GpioState()
+_state_lock = threading.Lock()
 
-# Thread for blinking
-blink_thread = None
+# Long-lived blink thread, fed ("start", duration, speed, gen) commands.
+# Every blink_led and stop_blink bumps _blink_gen, and a blink whose gen is
+# no longer current ends (or never starts). Setting blink_stop_event wakes
+# the running blink so it notices straight away.
+_cmd_queue = queue.Queue()
+_blink_scheduler_thread = None
+_blink_gen = 0
 blink_stop_event = threading.Event()
 
+# Per-edge blink logging (debug level); off by default, as logging every edge
+# dominates the loop at short blink intervals
+_log_edges = GPIO_CONFIG.get("log_blink_edges", False)
+
+# How blink_led drives the LED: "thread", "pwm" (RPi.GPIO PWM) or
+# "led_trigger" (kernel LED timer trigger)
+_blink_backend = "thread"
+_led_sysfs_dir = None  # Set when a kernel LED owns the LED pin
+_led_brightness_fd = None
+_led_on_value = b"1"  # The LED's max_brightness
+_pwm = None
+_blink_timer = None  # Ends a pwm/led_trigger blink after its duration
+
+def _select_blink_backend():
+    """
+    Choose how blink_led drives the LED
+    
+    A kernel LED opened by _open_led_class is preferred, then
+    GPIO_CONFIG["blink_backend"]:
+    "pwm" (RPi.GPIO's PWM, if RPi.GPIO is the driver) or "itimer" (SIGALRM
+    ticks). Otherwise the Python blink thread is used.
+    """
+    global _blink_backend, _pwm
+    
+    if _led_sysfs_dir:
+        _blink_backend = "led_trigger"
+        logger.info("[GPIO] Blinking via kernel LED trigger: %s", _led_sysfs_dir)
+        return
+    
+    requested = GPIO_CONFIG.get("blink_backend", "thread")
+    if requested == "pwm":
+        if GPIO_DRIVER != "RPi.GPIO":
+            logger.warning("[GPIO] Warning: PWM blinking needs RPi.GPIO (driver is %s), using thread",
+                           GPIO_DRIVER)
+        else:
+            try:
+                if _pwm is None:
+                    _pwm = GPIO.PWM(_LED_PIN, 1.0)
+                _blink_backend = "pwm"
+                return
+            except Exception as e:
+                logger.warning("[GPIO] Warning: PWM not available, using thread: %s", e)
+    
+    if requested == "itimer":
+        if hasattr(signal, "setitimer"):
+            _blink_backend = "itimer"
+            return
+        logger.warning("[GPIO] Warning: signal.setitimer not available, using thread")
+    
+    _blink_backend = "thread"
+
+def _open_led_class():
+    """
+    Use the kernel LED named by GPIO_CONFIG["led_sysfs_name"], if any
+    
+    The gpio-led overlay claims the LED GPIO for the kernel, so the pin
+    cannot be requested through a GPIO driver; on/off goes through the
+    LED's brightness file and blinking through its trigger instead.
+    
+    Returns:
+        bool: True if the kernel LED drives the LED pin
+    """
+    global _led_sysfs_dir, _led_brightness_fd, _led_on_value
+    
+    led_name = GPIO_CONFIG.get("led_sysfs_name")
+    if not led_name:
+        return False
+    
+    _led_sysfs_dir = os.path.join("/sys/class/leds", led_name)
+    try:
+        with open(os.path.join(_led_sysfs_dir, "max_brightness")) as f:
+            _led_on_value = f.read().strip().encode()
+        _led_brightness_fd = os.open(os.path.join(_led_sysfs_dir, "brightness"),
+                                     os.O_WRONLY)
+        # Start off, with no trigger driving the LED
+        _write_led_attr("trigger", "none")
+        _led_class_output(None, 0)
+    except OSError as e:
+        logger.warning("[GPIO] Warning: kernel LED '%s' not usable, driving the pin: %s",
+                       led_name, e)
+        _close_led_class()
+        return False
+    
+    return True
+
+def _close_led_class():
+    """Close the kernel LED's brightness file"""
+    global _led_sysfs_dir, _led_brightness_fd
+    
+    if _led_brightness_fd is not None:
+        os.close(_led_brightness_fd)
+        _led_brightness_fd = None
+    _led_sysfs_dir = None
+
+def _led_class_output(pin, value):
+    """Switch the kernel LED on or off through its brightness file"""
+    os.pwrite(_led_brightness_fd, _led_on_value if value else b"0", 0)
+
+def _schedule_blink_end(duration, stop, gen):
+    """Call stop once duration seconds have passed, if gen is still current"""
+    global _blink_timer
+    
+    _blink_timer = threading.Timer(duration, _end_timed_blink, args=(stop, gen))
+    _blink_timer.daemon = True
+    _blink_timer.start()
+
+def _end_timed_blink(stop, gen):
+    """
+    Timer callback ending a pwm/led_trigger blink
+    
+    cancel() cannot stop a callback that is already running, so a timer
+    left over from an earlier blink checks its generation instead. The
+    lock is held throughout, so a new blink cannot start half-way.
+    """
+    with _state_lock:
+        if gen != _blink_gen:
+            return
+        stop()
+        gpio_state.blinking = False
+        gpio_state.led_on = False
+
+def _write_led_attr(name, value):
+    """Write an attribute of the configured kernel LED"""
+    with open(os.path.join(_led_sysfs_dir, name), "w") as f:
+        f.write(value)
+
+def _start_trigger_blink(duration, speed, gen):
+    """Let the kernel blink the LED, and schedule switching it back off"""
+    delay_ms = str(max(1, int(speed * 500)))
+    _write_led_attr("trigger", "timer")
+    _write_led_attr("delay_on", delay_ms)
+    _write_led_attr("delay_off", delay_ms)
+    _schedule_blink_end(duration, _stop_trigger_blink, gen)
+
+def _stop_trigger_blink():
+    """Detach the kernel timer trigger, which also turns the LED off"""
+    if _blink_timer:
+        _blink_timer.cancel()
+    try:
+        _write_led_attr("trigger", "none")
+    except OSError as e:
+        logger.error("[GPIO] Error restoring LED trigger: %s", e)
+
+def _start_pwm_blink(duration, speed, gen):
+    """Blink with a 50% duty PWM, toggled by RPi.GPIO's C thread"""
+    _pwm.ChangeFrequency(1.0 / speed)
+    _pwm.start(50)
+    _schedule_blink_end(duration, _stop_pwm_blink, gen)
+
+def _stop_pwm_blink():
+    """Stop the PWM and leave the LED off"""
+    if _blink_timer:
+        _blink_timer.cancel()
+    try:
+        _pwm.stop()
+        _led_output(_LED_PIN, _LOW)
+    except Exception as e:
+        logger.error("[GPIO] Error stopping PWM: %s", e)
+
+# Direct access to the BCM283x GPIO registers through /dev/gpiomem. Writing a
+# pin's bit to GPSET0/GPCLR0 skips RPi.GPIO's per-call validation overhead.
+# Only used alongside RPi.GPIO, which drives the same registers; gpiod and
+# sysfs hold a kernel line request that register writes would bypass.
+_GPSET0 = 0x1C  # Output set register, pins 0-31
+_GPCLR0 = 0x28  # Output clear register, pins 0-31
+_BCM283X_COMPATIBLE = (b"brcm,bcm2835", b"brcm,bcm2836", b"brcm,bcm2837")
+_gpiomem = None
+_gpio_regs = None  # 32-bit view of the mapped registers
+
+# Function used to drive the LED pin, called as _led_output(pin, level)
+_led_output = None
+
+# gpiod request holding the LED and button lines
+_gpiod_request = None
+
+# Debounce period for button presses
+_BUTTON_BOUNCE_MS = 20
+
+# LED pin and output levels, bound once by initialize_gpio so the toggle and
+# blink paths skip the config dict and GPIO attribute lookups
+_LED_PIN = None
+_HIGH = 1
+_LOW = 0
+
+def _is_bcm283x():
+    """
+    Check the device tree for a BCM2835/2836/2837 SoC
+    
+    /dev/gpiomem exists on other boards too (e.g. the BCM2712 in the Pi 5),
+    where the registers are laid out differently.
+    """
+    try:
+        with open("/proc/device-tree/compatible", "rb") as f:
+            compatible = f.read().split(b"\0")
+    except OSError:
+        return False
+    return any(c in _BCM283X_COMPATIBLE for c in compatible)
+
+def _open_gpiomem(pin):
+    """
+    Map the GPIO registers for direct writes to pin
+    
+    Returns:
+        bool: True if direct register writes are available for pin
+    """
+    global _gpiomem, _gpio_regs
+    
+    if GPIO_DRIVER != "RPi.GPIO" or GPIO_CONFIG["pin_mode"] != "BCM" or not 0 <= pin < 32:
+        return False
+    if not _is_bcm283x():
+        return False
+    
+    try:
+        fd = os.open("/dev/gpiomem", os.O_RDWR | os.O_SYNC)
+        try:
+            _gpiomem = mmap.mmap(fd, 4096, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+    except (OSError, ValueError) as e:
+        logger.info("[GPIO] /dev/gpiomem not available, using %s output: %s", GPIO_DRIVER, e)
+        return False
+    
+    _gpio_regs = memoryview(_gpiomem).cast("I")
+    return True
+
+def _close_gpiomem():
+    """Release the GPIO register mapping"""
+    global _gpiomem, _gpio_regs
+    
+    if _gpio_regs is not None:
+        _gpio_regs.release()
+        _gpio_regs = None
+    if _gpiomem is not None:
+        _gpiomem.close()
+        _gpiomem = None
+
+def _gpiomem_output(pin, value):
+    """Set or clear a pin with a single 32-bit register store"""
+    _gpio_regs[(_GPSET0 if value else _GPCLR0) >> 2] = 1 << pin
+
+# Legacy /sys/class/gpio interface. The value files stay open so each write
+# or read is a single positioned syscall.
+_SYSFS_GPIO = "/sys/class/gpio"
+_sysfs_led_fd = None
+_sysfs_button_fd = None
+_sysfs_exported = []  # sysfs line numbers exported by initialize_gpio
+_SYSFS_SETTLE_S = 1.0  # How long to wait for udev after an export
+
+def _sysfs_gpio_base():
+    """
+    Find the sysfs number of BCM GPIO 0
+    
+    Newer kernels no longer start the SoC's GPIO chip at 0 (512 is common),
+    so the base is read from the chip rather than assumed.
+    
+    Returns:
+        int: Offset to add to a BCM pin number
+    """
+    bases = []
+    for name in os.listdir(_SYSFS_GPIO):
+        if not name.startswith("gpiochip"):
+            continue
+        chip_dir = os.path.join(_SYSFS_GPIO, name)
+        with open(os.path.join(chip_dir, "base")) as f:
+            base = int(f.read())
+        with open(os.path.join(chip_dir, "label")) as f:
+            if f.read().startswith("pinctrl-bcm"):
+                return base
+        bases.append(base)
+    return min(bases) if bases else 0
+
+def _sysfs_open_line(line, direction, edge=None):
+    """Export a sysfs GPIO line, configure it and open its value file"""
+    line_dir = os.path.join(_SYSFS_GPIO, f"gpio{line}")
+    if not os.path.isdir(line_dir):
+        with open(os.path.join(_SYSFS_GPIO, "export"), "w") as f:
+            f.write(str(line))
+        _sysfs_exported.append(line)
+    
+    _sysfs_retry(_sysfs_write_attr, os.path.join(line_dir, "direction"), direction)
+    if edge:
+        _sysfs_retry(_sysfs_write_attr, os.path.join(line_dir, "edge"), edge)
+    
+    return _sysfs_retry(os.open, os.path.join(line_dir, "value"), os.O_RDWR)
+
+def _sysfs_write_attr(path, value):
+    """Write a sysfs GPIO attribute"""
+    with open(path, "w") as f:
+        f.write(value)
+
+def _sysfs_retry(func, *args):
+    """
+    Call func, retrying for up to _SYSFS_SETTLE_S while a freshly exported
+    line's files are missing or still root-only
+    
+    udev creates and chowns gpioN/* asynchronously after an export, so a
+    non-root user in the gpio group can briefly hit ENOENT or EACCES.
+    """
+    deadline = time.monotonic() + _SYSFS_SETTLE_S
+    while True:
+        try:
+            return func(*args)
+        except (FileNotFoundError, PermissionError):
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.01)
+
+def _open_sysfs(led_pin, button_pin):
+    """Set up the LED and button pins through sysfs"""
+    global _sysfs_led_fd, _sysfs_button_fd
+    
+    base = _sysfs_gpio_base()
+    if led_pin is not None:
+        # "low" makes the line an output that starts off
+        _sysfs_led_fd = _sysfs_open_line(base + led_pin, "low")
+    if button_pin:
+        # sysfs cannot enable pull-ups; the pin keeps its boot default
+        _sysfs_button_fd = _sysfs_open_line(base + button_pin, "in", edge="falling")
+
+def _close_sysfs():
+    """Close the sysfs value files and unexport the lines we exported"""
+    global _sysfs_led_fd, _sysfs_button_fd
+    
+    for fd in (_sysfs_led_fd, _sysfs_button_fd):
+        if fd is not None:
+            os.close(fd)
+    _sysfs_led_fd = _sysfs_button_fd = None
+    
+    while _sysfs_exported:
+        with open(os.path.join(_SYSFS_GPIO, "unexport"), "w") as f:
+            f.write(str(_sysfs_exported.pop()))
+
+def _sysfs_output(pin, value):
+    """Write the LED level with a single pwrite on the cached value fd"""
+    os.pwrite(_sysfs_led_fd, b"1" if value else b"0", 0)
+
+def _request_gpiod_lines(led_pin, button_pin):
+    """Request the LED and button lines from the GPIO chip in one call"""
+    global _gpiod_request
+    
+    config = {}
+    if led_pin is not None:
+        config[led_pin] = gpiod.LineSettings(
+            direction=Direction.OUTPUT, output_value=Value.INACTIVE
+        )
+    if button_pin:
+        config[button_pin] = gpiod.LineSettings(
+            direction=Direction.INPUT,
+            bias=Bias.PULL_UP,
+            edge_detection=Edge.FALLING,
+            debounce_period=timedelta(milliseconds=_BUTTON_BOUNCE_MS)
+        )
+    
+    if not config:
+        return
+    
+    _gpiod_request = gpiod.request_lines(
+        GPIO_CONFIG.get("gpio_chip", "/dev/gpiochip0"),
+        consumer="rasp.py",
+        config=config
+    )
+
+def _load_gpio_driver():
+    """
+    Import the selected GPIO library, moving on to the next driver in
+    _DRIVER_ORDER if it cannot be used (e.g. gpiod v1 has no gpiod.line)
+    
+    Returns:
+        bool: True if a driver is ready
+    """
+    global GPIO_DRIVER, GPIO, gpiod, Bias, Direction, Edge, Value
+    
+    while GPIO_DRIVER is not None:
+        try:
+            if GPIO_DRIVER == "gpiod":
+                import gpiod
+                from gpiod.line import Bias, Direction, Edge, Value
+            elif GPIO_DRIVER == "RPi.GPIO":
+                import RPi.GPIO as GPIO
+            return True
+        except ImportError as e:
+            logger.warning("[GPIO] %s not usable: %s", GPIO_DRIVER, e)
+            later = _DRIVER_ORDER[_DRIVER_ORDER.index(GPIO_DRIVER) + 1:]
+            GPIO_DRIVER = next((d for d in later if _driver_present(d)), None)
+    
+    return False
+
 def initialize_gpio():
     """Initialize GPIO pins"""
-    if not IS_RASPBERRY_PI or not GPIO_AVAILABLE:
-        print("[GPIO] Simulation mode: GPIO initialized")
-        gpio_state["initialized"] = True
+    global _led_output, _LED_PIN, _HIGH, _LOW
+    
+    _start_blink_scheduler()
+    
+    if not _REAL:
+        _select_blink_backend()
+        logger.info("[GPIO] Simulation mode: GPIO initialized")
+        gpio_state.initialized = True
         return True
     
+    if not _load_gpio_driver():
+        logger.error("[GPIO] Error initializing GPIO: no usable GPIO driver")
+        gpio_state.initialized = False
+        return False
+    
     try:
-        # Set pin numbering mode
-        if GPIO_CONFIG["pin_mode"] == "BCM":
-            GPIO.setmode(GPIO.BCM)
-        else:
-            GPIO.setmode(GPIO.BOARD)
-        
-        # Setup default LED pin
         led_pin = GPIO_CONFIG["default_led_pin"]
-        GPIO.setup(led_pin, GPIO.OUT)
-        GPIO.output(led_pin, GPIO.LOW)
+        button_pin = GPIO_CONFIG["default_button_pin"]
         
-        # Setup button pin if configured
-        if GPIO_CONFIG["default_button_pin"]:
-            button_pin = GPIO_CONFIG["default_button_pin"]
-            GPIO.setup(button_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        # A kernel LED owns its GPIO, so the driver only sets up the button
+        led_class = _open_led_class()
+        driver_led_pin = None if led_class else led_pin
         
-        gpio_state["initialized"] = True
-        print(f"[GPIO] GPIO initialized. LED on pin {led_pin}")
+        if GPIO_DRIVER == "gpiod":
+            _request_gpiod_lines(driver_led_pin, button_pin)
+            driver_output = _gpiod_request.set_value if _gpiod_request else None
+            driver_high = Value.ACTIVE
+            driver_low = Value.INACTIVE
+        elif GPIO_DRIVER == "sysfs":
+            _open_sysfs(driver_led_pin, button_pin)
+            driver_output, driver_high, driver_low = _sysfs_output, 1, 0
+        else:
+            # Set pin numbering mode
+            if GPIO_CONFIG["pin_mode"] == "BCM":
+                GPIO.setmode(GPIO.BCM)
+            else:
+                GPIO.setmode(GPIO.BOARD)
+            
+            # Setup default LED pin
+            if driver_led_pin is not None:
+                GPIO.setup(led_pin, GPIO.OUT)
+                GPIO.output(led_pin, GPIO.LOW)
+            
+            # Setup button pin if configured
+            if button_pin:
+                GPIO.setup(button_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            
+            driver_output = GPIO.output
+            driver_high = GPIO.HIGH
+            driver_low = GPIO.LOW
+        
+        # Pin direction stays with the driver; under RPi.GPIO on a BCM283x,
+        # levels are written directly to the registers
+        if led_class:
+            _led_output, _HIGH, _LOW = _led_class_output, 1, 0
+        elif _open_gpiomem(led_pin):
+            _led_output, _HIGH, _LOW = _gpiomem_output, 1, 0
+        else:
+            _led_output, _HIGH, _LOW = driver_output, driver_high, driver_low
+        _LED_PIN = led_pin
+        _select_blink_backend()
+        
+        gpio_state.initialized = True
+        logger.info("[GPIO] GPIO initialized via %s. LED on pin %s", GPIO_DRIVER, led_pin)
         return True
         
     except Exception as e:
-        print(f"[GPIO] Error initializing GPIO: {e}")
-        gpio_state["initialized"] = False
+        logger.error("[GPIO] Error initializing GPIO: %s", e)
+        gpio_state.initialized = False
         return False
 
+def _toggle_led_real(new_state):
+    """Drive the LED pin and return the new status"""
+    _led_output(_LED_PIN, _HIGH if new_state else _LOW)
+    gpio_state.led_on = new_state
+    
+    status = "ON" if new_state else "OFF"
+    logger.debug("[GPIO] LED turned %s (pin %s)", status, _LED_PIN)
+    return status
+
+def _toggle_led_sim(new_state):
+    """Record the simulated LED state and return the new status"""
+    gpio_state.led_on = new_state
+    status = "ON" if new_state else "OFF"
+    logger.debug("[GPIO Simulation] LED turned %s", status)
+    return status
+
+_toggle_led = _toggle_led_real if _REAL else _toggle_led_sim
+
 def toggle_led(state=None):
     """
     Toggle LED on/off
@@ -79,75 +571,242 @@ def toggle_led(state=None):
     Returns:
         dict: Result of operation
     """
-    if not gpio_state["initialized"]:
+    if not gpio_state.initialized:
         if not initialize_gpio():
             return {"success": False, "error": "GPIO not initialized"}
     
     # Stop blinking if active
-    if gpio_state["blinking"]:
+    if gpio_state.blinking:
         stop_blink()
     
-    # Determine new state
-    if state is None:
-        new_state = not gpio_state["led_on"]
-    else:
-        new_state = bool(state)
-    
     try:
-        if IS_RASPBERRY_PI and GPIO_AVAILABLE:
-            led_pin = GPIO_CONFIG["default_led_pin"]
-            GPIO.output(led_pin, GPIO.HIGH if new_state else GPIO.LOW)
-            gpio_state["led_on"] = new_state
+        with _state_lock:
+            # Determine new state
+            if state is None:
+                new_state = not gpio_state.led_on
+            else:
+                new_state = bool(state)
             
-            status = "ON" if new_state else "OFF"
-            print(f"[GPIO] LED turned {status} (pin {led_pin})")
-        else:
-            # Simulation mode
-            gpio_state["led_on"] = new_state
-            status = "ON" if new_state else "OFF"
-            print(f"[GPIO Simulation] LED turned {status}")
+            status = _toggle_led(new_state)
         
         return {
             "success": True,
-            "led_on": gpio_state["led_on"],
+            "led_on": gpio_state.led_on,
             "message": f"LED is now {status}"
         }
         
     except Exception as e:
-        print(f"[GPIO] Error toggling LED: {e}")
+        logger.error("[GPIO] Error toggling LED: %s", e)
         return {"success": False, "error": str(e)}
 
-def _blink_worker(duration=5, speed=0.5):
-    """Worker function for blinking LED in background"""
-    if not IS_RASPBERRY_PI or not GPIO_AVAILABLE:
-        # Simulation blinking
-        end_time = time.time() + duration
-        while not blink_stop_event.is_set() and time.time() < end_time:
-            gpio_state["led_on"] = not gpio_state["led_on"]
-            status = "ON" if gpio_state["led_on"] else "OFF"
-            print(f"[GPIO Simulation] LED blinking: {status}")
-            time.sleep(speed)
-        return
+def _promote_blink_thread():
+    """
+    Move the calling thread to SCHED_FIFO, and onto GPIO_CONFIG["isolated_cpu"]
+    if one is configured, so blink edges are not delayed by CFS timeslicing
+    
+    Both need CAP_SYS_NICE or a permissive cpuset; without them the thread
+    simply stays as it was.
+    """
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+    except (AttributeError, OSError):
+        pass
+    
+    cpu = GPIO_CONFIG.get("isolated_cpu")
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except (AttributeError, OSError):
+            pass
+
+# Both blink workers wait on the stop event as their blink delay, so a stop
+# request wakes them immediately. Deadlines are integers on the monotonic
+# clock, which is immune to wall-clock adjustments. The LED level lives in a
+# local int flipped with ^= 1, and is written back to gpio_state once the
+# blink is over.
+
+def _blink_worker_sim(duration=5, speed=0.5, gen=0):
+    """Simulated blinking, tracking the LED state only"""
+    start_ns = time.monotonic_ns()
+    deadline_ns = start_ns + int(duration * 1e9)
+    edges = 0
+    level = int(gpio_state.led_on)
     
-    # Real GPIO blinking
-    led_pin = GPIO_CONFIG["default_led_pin"]
-    end_time = time.time() + duration
+    while gen == _blink_gen:
+        remaining_ns = deadline_ns - time.monotonic_ns()
+        if remaining_ns <= 0:
+            break
+        level ^= 1
+        edges += 1
+        if _log_edges:
+            logger.debug("[GPIO Simulation] LED blinking: %s", ("OFF", "ON")[level])
+        if blink_stop_event.wait(min(speed, remaining_ns / 1e9)):
+            break
+    
+    # A stale blink leaves the state to whoever superseded it
+    with _state_lock:
+        if gen == _blink_gen:
+            gpio_state.led_on = bool(level)
+            gpio_state.blinking = False
+    _log_blink_summary(edges, start_ns)
+
+def _blink_worker_real(duration=5, speed=0.5, gen=0):
+    """Blink the LED pin; everything the loop touches is bound to a local"""
+    start_ns = time.monotonic_ns()
+    deadline_ns = start_ns + int(duration * 1e9)
+    edges = 0
+    
+    out = _led_output
+    pin = _LED_PIN
+    hi = _HIGH
+    lo = _LOW
+    levels = (lo, hi)
+    level = 0
+    half = speed * 0.5
+    wait = blink_stop_event.wait
+    now_ns = time.monotonic_ns
+    lock = _state_lock
     
     try:
-        while not blink_stop_event.is_set() and time.time() < end_time:
-            GPIO.output(led_pin, GPIO.HIGH)
-            time.sleep(speed / 2)
-            if blink_stop_event.is_set():
+        # Each edge checks the generation under the state lock, which
+        # _next_blink_gen also takes, so once stop_blink or blink_led has
+        # returned a stale blink never touches the pin again
+        while True:
+            remaining_ns = deadline_ns - now_ns()
+            if remaining_ns <= 0:
+                break
+            with lock:
+                if gen != _blink_gen:
+                    break
+                level ^= 1
+                out(pin, levels[level])
+            edges += 1
+            if wait(min(half, remaining_ns / 1e9)):
                 break
-            GPIO.output(led_pin, GPIO.LOW)
-            time.sleep(speed / 2)
         
-        # Ensure LED is off after blinking
-        GPIO.output(led_pin, GPIO.LOW)
-        gpio_state["led_on"] = False
+        # Ensure LED is off after blinking, unless a newer command owns it
+        with lock:
+            if gen == _blink_gen:
+                out(pin, lo)
+                gpio_state.led_on = False
+                gpio_state.blinking = False
+        _log_blink_summary(edges, start_ns)
         
     except Exception as e:
-        print(f"[GPIO] Error during blinking: {e}")
+        logger.error("[GPIO] Error during blinking: %s", e)
+
+def _log_blink_summary(edges, start_ns):
+    """Log one line summarising a finished blink"""
+    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+    logger.debug("[GPIO] Blinked %d edges in %.3fs", edges, elapsed)
+
+_blink_worker = _blink_worker_real if _REAL else _blink_worker_sim
+
+# State of an itimer blink, driven by SIGALRM on the main thread
+_itimer_active = False
+_itimer_edges = 0  # Edges left before the blink ends
+_itimer_level = 0
+_prev_alarm_handler = None  # SIGALRM handler to restore once the blink ends
+
+def _on_blink_tick(signum, frame):
+    """SIGALRM handler: drive the next blink edge, or end the blink"""
+    global _itimer_edges, _itimer_level
+    
+    if not _itimer_active:
+        return
+    if _itimer_edges <= 0:
+        # The main thread may already hold the lock this handler interrupted,
+        # so never block on it; the timer is still armed, try the next tick
+        if not _state_lock.acquire(blocking=False):
+            return
+        try:
+            _stop_itimer_blink()
+            gpio_state.blinking = False
+            gpio_state.led_on = False
+        finally:
+            _state_lock.release()
+        return
+    
+    _itimer_edges -= 1
+    _itimer_level ^= 1
+    if _REAL:
+        _led_output(_LED_PIN, (_LOW, _HIGH)[_itimer_level])
+    elif _log_edges:
+        logger.debug("[GPIO Simulation] LED blinking: %s", ("OFF", "ON")[_itimer_level])
+
+def _start_itimer_blink(duration, speed):
+    """
+    Blink from kernel interval timer ticks instead of a thread
+    
+    Python runs signal handlers on the main thread between bytecodes, so
+    an edge due while the main thread is inside a long C call (such as
+    model generation) waits until that call returns.
+    """
+    global _itimer_active, _itimer_edges, _itimer_level, _prev_alarm_handler
+    
+    half = speed * 0.5
+    previous = signal.signal(signal.SIGALRM, _on_blink_tick)
+    if previous is not _on_blink_tick:
+        _prev_alarm_handler = previous
+    # The first edge is driven right away and the rest on ticks; the tick
+    # after the last edge ends the blink, duration seconds after it started
+    _itimer_edges = max(1, round(duration / half))
+    _itimer_level = 0
+    _itimer_active = True
+    # Armed before the first edge: if that edge already ends the blink,
+    # the stop it triggers disarms the timer rather than racing it
+    signal.setitimer(signal.ITIMER_REAL, half, half)
+    _on_blink_tick(signal.SIGALRM, None)
+    if not _itimer_active:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _stop_itimer_blink():
+    """Cancel the interval timer, restore SIGALRM and leave the LED off"""
+    global _itimer_active, _prev_alarm_handler
+    
+    _itimer_active = False
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    # Handlers can only be set from the main thread; from elsewhere ours
+    # stays installed, but does nothing while no itimer blink is active
+    if (_prev_alarm_handler is not None
+            and threading.current_thread() is threading.main_thread()):
+        signal.signal(signal.SIGALRM, _prev_alarm_handler)
+        _prev_alarm_handler = None
+    if _REAL:
+        _led_output(_LED_PIN, _LOW)
+
+def _blink_scheduler():
+    """Run blink commands from _cmd_queue one at a time"""
+    if IS_RASPBERRY_PI:
+        _promote_blink_thread()
+    
+    while True:
+        cmd = _cmd_queue.get()
+        if cmd[0] == "start" and cmd[3] == _blink_gen:
+            try:
+                _blink_worker(cmd[1], cmd[2], cmd[3])
+            except Exception as e:
+                logger.error("[GPIO] Error in blink scheduler: %s", e)
+
+def _next_blink_gen():
+    """Make every earlier blink stale and return the new generation"""
+    global _blink_gen
+    
+    with _state_lock:
+        _blink_gen += 1
+        return _blink_gen
+
+def _start_blink_scheduler():
+    """Start the blink scheduler thread unless it is already running"""
+    global _blink_scheduler_thread
+    
+    if _blink_scheduler_thread is None:
+        _blink_scheduler_thread = threading.Thread(
+            target=_blink_scheduler,
+            name="blink-scheduler",
+            daemon=True
+        )
+        _blink_scheduler_thread.start()
 
 def blink_led(duration=5, speed=0.5):
     """
@@ -160,28 +819,47 @@ def blink_led(duration=5, speed=0.5):
     Returns:
         dict: Result of operation
     """
-    global blink_thread, blink_stop_event
-    
-    if not gpio_state["initialized"]:
+    if not gpio_state.initialized:
         if not initialize_gpio():
             return {"success": False, "error": "GPIO not initialized"}
     
     # Stop any existing blinking
-    if gpio_state["blinking"]:
+    if gpio_state.blinking:
         stop_blink()
     
-    # Create new blinking thread
-    blink_stop_event.clear()
-    blink_thread = threading.Thread(
-        target=_blink_worker,
-        args=(duration, speed),
-        daemon=True
-    )
+    # Tags this blink; whatever ends it only acts while gen is current.
+    # Marked as blinking before it starts, so even a blink that ends at
+    # once leaves the flag cleared.
+    gen = _next_blink_gen()
+    gpio_state.blinking = True
     
-    gpio_state["blinking"] = True
-    blink_thread.start()
+    if _blink_backend == "led_trigger":
+        try:
+            _start_trigger_blink(duration, speed, gen)
+        except OSError as e:
+            logger.error("[GPIO] Error starting LED trigger: %s", e)
+            gpio_state.blinking = False
+            return {"success": False, "error": str(e)}
+    elif _blink_backend == "pwm":
+        try:
+            _start_pwm_blink(duration, speed, gen)
+        except Exception as e:
+            logger.error("[GPIO] Error starting PWM: %s", e)
+            gpio_state.blinking = False
+            return {"success": False, "error": str(e)}
+    elif (_blink_backend == "itimer"
+            and threading.current_thread() is threading.main_thread()):
+        # SIGALRM handlers can only be installed from the main thread;
+        # other callers use the scheduler thread below. Any scheduler
+        # blink still running (now stale) is woken so only one drives the pin.
+        blink_stop_event.set()
+        _start_itimer_blink(duration, speed)
+    else:
+        # Hand the blink to the scheduler thread
+        blink_stop_event.clear()
+        _cmd_queue.put(("start", duration, speed, gen))
     
-    print(f"[GPIO] Started blinking for {duration} seconds at {speed}s interval")
+    logger.debug("[GPIO] Started blinking for %s seconds at %ss interval", duration, speed)
     
     return {
         "success": True,
@@ -193,70 +871,158 @@ def blink_led(duration=5, speed=0.5):
 
 def stop_blink():
     """Stop blinking LED"""
-    global blink_thread
-    
-    if gpio_state["blinking"]:
-        blink_stop_event.set()
-        if blink_thread and blink_thread.is_alive():
-            blink_thread.join(timeout=1.0)
-        
-        gpio_state["blinking"] = False
-        print("[GPIO] Blinking stopped")
+    if gpio_state.blinking:
+        # The running blink, and any timer set to end it, is stale from here
+        _next_blink_gen()
+        if _blink_backend == "led_trigger":
+            _stop_trigger_blink()
+        elif _blink_backend == "pwm":
+            _stop_pwm_blink()
+        elif _itimer_active:
+            _stop_itimer_blink()
+        else:
+            blink_stop_event.set()
         
         # Turn off LED
-        if IS_RASPBERRY_PI and GPIO_AVAILABLE and gpio_state["initialized"]:
+        if _REAL and gpio_state.initialized:
             try:
-                led_pin = GPIO_CONFIG["default_led_pin"]
-                GPIO.output(led_pin, GPIO.LOW)
-                gpio_state["led_on"] = False
+                _led_output(_LED_PIN, _LOW)
             except:
                 pass
+        
+        with _state_lock:
+            gpio_state.blinking = False
+            gpio_state.led_on = False
+        logger.debug("[GPIO] Blinking stopped")
     
     return {"success": True, "blinking": False}
 
 def read_button():
     """Read button state if configured"""
-    if not IS_RASPBERRY_PI or not GPIO_AVAILABLE:
+    if not _REAL:
         return {"success": False, "error": "Simulation mode"}
     
     if not GPIO_CONFIG["default_button_pin"]:
         return {"success": False, "error": "Button not configured"}
     
+    if not gpio_state.initialized:
+        if not initialize_gpio():
+            return {"success": False, "error": "GPIO not initialized"}
+    
     try:
         button_pin = GPIO_CONFIG["default_button_pin"]
-        state = GPIO.input(button_pin)
+        if GPIO_DRIVER == "gpiod":
+            state = 1 if _gpiod_request.get_value(button_pin) == Value.ACTIVE else 0
+        elif GPIO_DRIVER == "sysfs":
+            state = int(os.pread(_sysfs_button_fd, 1, 0))
+        else:
+            state = GPIO.input(button_pin)
         return {
             "success": True,
-            "pressed": state == GPIO.LOW,  # Assuming pull-up, LOW when pressed
+            "pressed": state == 0,  # Assuming pull-up, LOW when pressed
             "raw_state": state
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def wait_for_button(timeout_ms=None):
+    """
+    Block until the button is pressed, letting the kernel do the waiting
+    
+    Args:
+        timeout_ms (int, optional): Give up after this many milliseconds.
+            If None, waits indefinitely.
+    
+    Returns:
+        dict: Result of operation
+    """
+    if not _REAL:
+        return {"success": False, "error": "Simulation mode"}
+    
+    if not GPIO_CONFIG["default_button_pin"]:
+        return {"success": False, "error": "Button not configured"}
+    
+    if not gpio_state.initialized:
+        if not initialize_gpio():
+            return {"success": False, "error": "GPIO not initialized"}
+    
+    try:
+        button_pin = GPIO_CONFIG["default_button_pin"]
+        if GPIO_DRIVER == "gpiod":
+            # Drop presses queued before this call
+            if _gpiod_request.wait_edge_events(timedelta(0)):
+                _gpiod_request.read_edge_events()
+            timeout = None if timeout_ms is None else timedelta(milliseconds=timeout_ms)
+            pressed = _gpiod_request.wait_edge_events(timeout)
+            if pressed:
+                _gpiod_request.read_edge_events()
+        elif GPIO_DRIVER == "sysfs":
+            # An edge is signalled as POLLPRI; reading the value re-arms it.
+            # sysfs has no debouncing.
+            os.pread(_sysfs_button_fd, 1, 0)
+            poller = select.poll()
+            poller.register(_sysfs_button_fd, select.POLLPRI | select.POLLERR)
+            pressed = bool(poller.poll(-1 if timeout_ms is None else timeout_ms))
+            if pressed:
+                os.pread(_sysfs_button_fd, 1, 0)
+        else:
+            # wait_for_edge arms its own edge detection, so the button must
+            # not also be registered with add_event_detect
+            kwargs = {"bouncetime": _BUTTON_BOUNCE_MS}
+            if timeout_ms is not None:
+                kwargs["timeout"] = timeout_ms
+            pressed = GPIO.wait_for_edge(button_pin, GPIO.FALLING, **kwargs) is not None
+        
+        return {
+            "success": True,
+            "pressed": pressed,
+            "timed_out": not pressed
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 def get_gpio_status():
     """Get current GPIO status"""
+    with _state_lock:
+        initialized = gpio_state.initialized
+        led_on = gpio_state.led_on
+        blinking = gpio_state.blinking
+    
     return {
-        "initialized": gpio_state["initialized"],
-        "led_on": gpio_state["led_on"],
-        "blinking": gpio_state["blinking"],
+        "initialized": initialized,
+        "led_on": led_on,
+        "blinking": blinking,
         "is_raspberry_pi": IS_RASPBERRY_PI,
-        "gpio_available": GPIO_AVAILABLE
+        "gpio_available": GPIO_AVAILABLE,
+        "gpio_driver": GPIO_DRIVER
     }
 
 def cleanup_gpio():
     """Cleanup GPIO resources"""
-    print("[GPIO] Cleaning up GPIO...")
+    global _pwm, _gpiod_request
+    
+    logger.info("[GPIO] Cleaning up GPIO...")
     
     # Stop blinking
     stop_blink()
     
     # Cleanup GPIO if initialized
-    if IS_RASPBERRY_PI and GPIO_AVAILABLE and gpio_state["initialized"]:
+    if _REAL and gpio_state.initialized:
         try:
-            GPIO.cleanup()
-            print("[GPIO] GPIO cleanup complete")
+            _close_gpiomem()
+            _close_led_class()
+            if GPIO_DRIVER == "gpiod":
+                if _gpiod_request is not None:
+                    _gpiod_request.release()
+                    _gpiod_request = None
+            elif GPIO_DRIVER == "sysfs":
+                _close_sysfs()
+            else:
+                _pwm = None  # Released before cleanup so the pin can be reused
+                GPIO.cleanup()
+            logger.info("[GPIO] GPIO cleanup complete")
         except Exception as e:
-            print(f"[GPIO] Error during cleanup: {e}")
+            logger.error("[GPIO] Error during cleanup: %s", e)
     
-    gpio_state["initialized"] = False
-    print("[GPIO] Cleanup finished")
\ No newline at end of file
+    gpio_state.initialized = False
+    logger.info("[GPIO] Cleanup finished")
\ No newline at end of file